@@ -391,10 +391,16 @@ class DatabaseManager:
         async with self.get_connection() as conn:
             try:
                 if self.db_type == 'sqlite':
+                    # Upsert вместо INSERT OR REPLACE: REPLACE удаляет и заново вставляет
+                    # строку (лишняя перестройка индексов и сброс остальных колонок)
                     await conn.execute(f"""
-                        INSERT OR REPLACE INTO {self.tables['users']} 
+                        INSERT INTO {self.tables['users']} 
                         (user_id, telegram_username, first_name, mode, last_active)
                         VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                        ON CONFLICT (user_id) DO UPDATE SET
+                            telegram_username = excluded.telegram_username,
+                            first_name = excluded.first_name,
+                            last_active = CURRENT_TIMESTAMP
                     """, (user_id, username, first_name, mode))
                     await conn.commit()
                 else:
@@ -494,7 +500,6 @@ class DatabaseManager:
                         (user_id, command, success, execution_time_ms, chat_type, error_message)
                         VALUES (?, ?, ?, ?, ?, ?)
                     """, (user_id, command, success, execution_time_ms, chat_type, error_message))
-                    await conn.commit()
                 else:
                     await conn.execute(f"""
                         INSERT INTO {self.tables['command_stats']} 
@@ -502,35 +507,36 @@ class DatabaseManager:
                         VALUES ($1, $2, $3, $4, $5, $6)
                     """, user_id, command, success, execution_time_ms, chat_type, error_message)
                 
-                # Обновляем счетчик команд пользователя
-                await self._update_user_command_count(user_id, command)
+                # Обновляем счетчик команд пользователя в том же соединении
+                await self._update_user_command_count(conn, user_id, command)
                 
-            except Exception as e:
-                logger.debug(f"Ошибка логирования команды: {e}")
-    
-    async def _update_user_command_count(self, user_id: int, command: str):
-        """Обновление счетчика команд пользователя"""
-        async with self.get_connection() as conn:
-            try:
                 if self.db_type == 'sqlite':
-                    await conn.execute(f"""
-                        UPDATE {self.tables['users']} 
-                        SET total_commands = total_commands + 1,
-                            favorite_command = ?,
-                            last_active = CURRENT_TIMESTAMP
-                        WHERE user_id = ?
-                    """, (command, user_id))
                     await conn.commit()
-                else:
-                    await conn.execute(f"""
-                        UPDATE {self.tables['users']} 
-                        SET total_commands = total_commands + 1,
-                            favorite_command = $1,
-                            last_active = CURRENT_TIMESTAMP
-                        WHERE user_id = $2
-                    """, command, user_id)
+                
             except Exception as e:
-                logger.debug(f"Ошибка обновления счетчика команд: {e}")
+                logger.debug(f"Ошибка логирования команды: {e}")
+    
+    async def _update_user_command_count(self, conn, user_id: int, command: str):
+        """Обновление счетчика команд пользователя (в соединении вызывающего)"""
+        try:
+            if self.db_type == 'sqlite':
+                await conn.execute(f"""
+                    UPDATE {self.tables['users']} 
+                    SET total_commands = total_commands + 1,
+                        favorite_command = ?,
+                        last_active = CURRENT_TIMESTAMP
+                    WHERE user_id = ?
+                """, (command, user_id))
+            else:
+                await conn.execute(f"""
+                    UPDATE {self.tables['users']} 
+                    SET total_commands = total_commands + 1,
+                        favorite_command = $1,
+                        last_active = CURRENT_TIMESTAMP
+                    WHERE user_id = $2
+                """, command, user_id)
+        except Exception as e:
+            logger.debug(f"Ошибка обновления счетчика команд: {e}")
     
     async def get_user_stats(self, user_id: int) -> Dict[str, Any]:
         """Получение статистики пользователя"""
@@ -584,42 +590,29 @@ class DatabaseManager:
         """Получение общей статистики бота"""
         async with self.get_connection() as conn:
             try:
-                stats = {}
-                
-                # Общее количество пользователей
-                if self.db_type == 'sqlite':
-                    async with conn.execute(f"SELECT COUNT(*) FROM {self.tables['users']}") as cursor:
-                        row = await cursor.fetchone()
-                        stats['total_users'] = row[0] if row else 0
-                else:
-                    row = await conn.fetchval(f"SELECT COUNT(*) FROM {self.tables['users']}")
-                    stats['total_users'] = row or 0
-                
-                # Активные пользователи за последние 24 часа
+                # Все счетчики одним запросом вместо трех отдельных
                 if self.db_type == 'sqlite':
                     async with conn.execute(f"""
-                        SELECT COUNT(*) FROM {self.tables['users']} 
-                        WHERE last_active > datetime('now', '-1 day')
+                        SELECT
+                            (SELECT COUNT(*) FROM {self.tables['users']}) as total_users,
+                            (SELECT COUNT(*) FROM {self.tables['users']}
+                             WHERE last_active > datetime('now', '-1 day')) as active_users_24h,
+                            (SELECT COUNT(*) FROM {self.tables['command_stats']}) as total_commands
                     """) as cursor:
                         row = await cursor.fetchone()
-                        stats['active_users_24h'] = row[0] if row else 0
                 else:
-                    row = await conn.fetchval(f"""
-                        SELECT COUNT(*) FROM {self.tables['users']} 
-                        WHERE last_active > NOW() - INTERVAL '1 day'
+                    row = await conn.fetchrow(f"""
+                        SELECT
+                            (SELECT COUNT(*) FROM {self.tables['users']}) as total_users,
+                            (SELECT COUNT(*) FROM {self.tables['users']}
+                             WHERE last_active > NOW() - INTERVAL '1 day') as active_users_24h,
+                            (SELECT COUNT(*) FROM {self.tables['command_stats']}) as total_commands
                     """)
-                    stats['active_users_24h'] = row or 0
                 
-                # Общее количество команд
-                if self.db_type == 'sqlite':
-                    async with conn.execute(f"SELECT COUNT(*) FROM {self.tables['command_stats']}") as cursor:
-                        row = await cursor.fetchone()
-                        stats['total_commands'] = row[0] if row else 0
-                else:
-                    row = await conn.fetchval(f"SELECT COUNT(*) FROM {self.tables['command_stats']}")
-                    stats['total_commands'] = row or 0
+                if not row:
+                    return {'total_users': 0, 'active_users_24h': 0, 'total_commands': 0}
                 
-                return stats
+                return dict(row)
                 
             except Exception as e:
                 logger.error(f"❌ Ошибка получения статистики бота: {e}")
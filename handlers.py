@@ -11,7 +11,7 @@ from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 
 from telethon import TelegramClient, events, Button
-from telethon.errors import SessionPasswordNeededError, ApiIdInvalidError
+from telethon.errors import SessionPasswordNeededError, ApiIdInvalidError, RPCError
 from telethon.tl.types import User, Chat, Channel
 
 from config import (
@@ -27,6 +27,12 @@ from database import DatabaseManager
 
 logger = logging.getLogger(__name__)
 
+# Маркеры строки со ссылкой на группу в сообщении с credentials
+GROUP_LINK_MARKERS = ('группа', 'group', 'http', 't.me')
+
+# Строка топика в ответе /scan: (название, ID, число сообщений)
+SCAN_TOPIC_ROW = "📌 **{}**\n   ID: `{}`\n   Сообщений: {}\n\n".format
+
 class BotHandlers:
     """Обработчики команд бота с улучшенной функциональностью"""
     
@@ -35,6 +41,24 @@ class BotHandlers:
         self.bot_client = None
         self.topic_scanner = None
         self.active_sessions = {}  # Активные пользовательские сессии
+        self.bot_id: Optional[int] = None  # ID самого бота, запрашиваем один раз при старте
+        
+        # Inline клавиатуры статичны - собираем кнопки один раз
+        self.keyboards = {
+            name: [[Button.inline(text, data) for text, data in row] for row in layout]
+            for name, layout in INLINE_KEYBOARDS.items()
+        }
+        
+        # Маршруты callback: data -> (обработчик, передавать user_id, ответить до вызова)
+        self.callback_routes = {
+            'mode_bot': (self.set_bot_mode, True, False),
+            'mode_user': (self.set_user_mode, True, False),
+            'help': (self.show_help_menu, False, False),
+            'stats': (self.show_stats, True, False),
+            'yo_bro': (self.handle_yo_bro, False, True),
+            'buy_bots': (self.handle_buy_bots, False, True),
+            'main_menu': (self.show_main_menu, False, False),
+        }
         
     async def initialize(self):
         """Инициализация обработчиков"""
@@ -48,6 +72,10 @@ class BotHandlers:
             
             await self.bot_client.start(bot_token=BOT_TOKEN)
             
+            # Свой ID не меняется - не запрашиваем get_me на каждую проверку прав
+            me = await self.bot_client.get_me()
+            self.bot_id = me.id
+            
             # Инициализация сканера топиков
             self.topic_scanner = TopicScanner(self.db_manager)
             
@@ -275,7 +303,8 @@ A: Используй /yo_bro для прямой связи!
         """Обработка команды сканирования топиков"""
         try:
             # Проверяем права в группе
-            if is_group_message(event):
+            in_group = is_group_message(event)
+            if in_group:
                 # В группе работаем только с упоминанием
                 if '@misterdms_topic_id_get_bot' not in event.text:
                     return  # Игнорируем команды без упоминания
@@ -290,10 +319,7 @@ A: Используй /yo_bro для прямой связи!
             
             # Выполняем сканирование
             user_id = event.sender_id
-            chat_id = event.chat_id if is_group_message(event) else None
-            
-            if not chat_id and is_group_message(event):
-                chat_id = event.chat_id
+            chat_id = event.chat_id if in_group else None
             
             # Получаем пользовательские настройки
             user_data = await self.db_manager.get_user(user_id)
@@ -309,17 +335,18 @@ A: Используй /yo_bro для прямой связи!
                 if not topics:
                     response = "🤷‍♂️ **Топиков не найдено**\n\nВозможно группа не использует топики."
                 else:
-                    response = f"📋 **НАЙДЕНО ТОПИКОВ: {len(topics)}**\n\n"
+                    parts = [f"📋 **НАЙДЕНО ТОПИКОВ: {len(topics)}**\n\n"]
                     
-                    for topic in topics[:10]:  # Показываем первые 10
-                        response += f"📌 **{topic['title']}**\n"
-                        response += f"   ID: `{topic['id']}`\n"
-                        response += f"   Сообщений: {topic.get('message_count', 0)}\n\n"
+                    parts.extend(
+                        SCAN_TOPIC_ROW(topic['title'], topic['id'], topic.get('message_count', 0))
+                        for topic in topics[:10]  # Показываем первые 10
+                    )
                     
                     if len(topics) > 10:
-                        response += f"... и еще {len(topics) - 10} топиков\n\n"
+                        parts.append(f"... и еще {len(topics) - 10} топиков\n\n")
                     
-                    response += "Используй /get_all для полной информации!"
+                    parts.append("Используй /get_all для полной информации!")
+                    response = ''.join(parts)
                 
                 # Обновляем сообщение
                 await progress_msg.edit(response)
@@ -401,24 +428,19 @@ A: Используй /yo_bro для прямой связи!
             data = event.data.decode('utf-8')
             user_id = event.sender_id
             
-            if data == 'mode_bot':
-                await self.set_bot_mode(event, user_id)
-            elif data == 'mode_user':
-                await self.set_user_mode(event, user_id)
-            elif data == 'help':
-                await self.show_help_menu(event)
-            elif data == 'stats':
-                await self.show_stats(event, user_id)
-            elif data == 'yo_bro':
-                await event.answer()
-                await self.handle_yo_bro(event)
-            elif data == 'buy_bots':
+            route = self.callback_routes.get(data)
+            if route is None:
+                await event.answer("🔧 Функция в разработке!")
+                return
+            
+            handler, pass_user_id, answer_first = route
+            if answer_first:
                 await event.answer()
-                await self.handle_buy_bots(event)
-            elif data == 'main_menu':
-                await self.show_main_menu(event)
+            
+            if pass_user_id:
+                await handler(event, user_id)
             else:
-                await event.answer("🔧 Функция в разработке!")
+                await handler(event)
             
         except Exception as e:
             logger.error(f"❌ Ошибка в callback: {e}")
@@ -427,18 +449,8 @@ A: Используй /yo_bro для прямой связи!
     # === ВСПОМОГАТЕЛЬНЫЕ МЕТОДЫ ===
     
     def create_inline_keyboard(self, keyboard_name: str):
-        """Создание inline клавиатуры"""
-        if keyboard_name not in INLINE_KEYBOARDS:
-            return None
-        
-        buttons = []
-        for row in INLINE_KEYBOARDS[keyboard_name]:
-            button_row = []
-            for text, data in row:
-                button_row.append(Button.inline(text, data))
-            buttons.append(button_row)
-        
-        return buttons
+        """Получение inline клавиатуры (собрана в __init__)"""
+        return self.keyboards.get(keyboard_name)
     
     async def set_bot_mode(self, event, user_id):
         """Установка режима бота"""
@@ -476,21 +488,27 @@ A: Используй /yo_bro для прямой связи!
         """Проверка административных прав бота"""
         try:
             # Получаем информацию о боте в чате
-            me = await self.bot_client.get_me()
-            member = await self.bot_client.get_permissions(chat_id, me.id)
+            member = await self.bot_client.get_permissions(chat_id, self.bot_id)
             
-            return member.is_admin
-        except:
+            return bool(member and member.is_admin)
+        except (ValueError, RPCError) as e:
+            # Чат не найден или бот не участник - значит прав нет
+            logger.debug(f"Не удалось проверить права бота в чате {chat_id}: {e}")
             return False
     
     def is_credentials_message(self, event) -> bool:
         """Проверка является ли сообщение credentials"""
-        if is_group_message(event):
+        # Фильтр срабатывает на каждое входящее сообщение:
+        # сначала дешевая проверка текста, тип чата - только для кандидатов
+        text = event.text
+        if not text:
             return False
-        
-        text = event.text.strip()
-        return ('API_ID:' in text and 'API_HASH:' in text) or \
-               ('api_id' in text.lower() and 'api_hash' in text.lower())
+
+        lowered = text.lower()
+        if 'api_id' not in lowered or 'api_hash' not in lowered:
+            return False
+
+        return not is_group_message(event)
     
     async def process_credentials(self, event):
         """Обработка пользовательских credentials"""
@@ -506,11 +524,12 @@ A: Используй /yo_bro для прямой связи!
             
             for line in lines:
                 line = line.strip()
-                if 'api_id' in line.lower():
+                line_lower = line.lower()
+                if 'api_id' in line_lower:
                     api_id = line.split(':')[-1].strip()
-                elif 'api_hash' in line.lower():
+                elif 'api_hash' in line_lower:
                     api_hash = line.split(':')[-1].strip()
-                elif any(x in line.lower() for x in ['группа', 'group', 'http', 't.me']):
+                elif any(x in line_lower for x in GROUP_LINK_MARKERS):
                     group_link = line
             
             if not api_id or not api_hash:
@@ -130,13 +130,19 @@ class GetIdBot:
             except asyncio.CancelledError:
                 pass
         
-        # Останавливаем компоненты
+        # Останавливаем компоненты: Telegram клиент и веб-сервер
+        # независимы друг от друга, поэтому гасим их параллельно
+        stop_tasks = []
         if self.bot_handlers:
-            await self.bot_handlers.shutdown()
+            stop_tasks.append(self.bot_handlers.shutdown())
         
         if self.web_server:
-            await self.web_server.stop()
+            stop_tasks.append(self.web_server.stop())
         
+        if stop_tasks:
+            await asyncio.gather(*stop_tasks, return_exceptions=True)
+        
+        # БД закрываем последней - обработчики могут писать в нее до конца
         if self.db_manager:
             await self.db_manager.close()
         
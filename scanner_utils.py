@@ -6,8 +6,11 @@
 
 import asyncio
 import logging
-from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any, Union
+import time
+from collections import Counter
+from operator import itemgetter
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Dict, Any, Tuple, Union
 import json
 
 from telethon import TelegramClient
@@ -19,17 +22,24 @@ from telethon.tl.types import Channel, Chat, User, MessageMediaDocument
 from telethon.tl.functions.channels import GetForumTopicsRequest
 from telethon.tl.functions.messages import GetHistoryRequest
 
-from utils import PerformanceUtils, ValidationUtils, EncryptionUtils
+from utils import PerformanceUtils, ValidationUtils, EncryptionUtils, format_timespan
 from database import DatabaseManager
 
 logger = logging.getLogger(__name__)
 
+# Сколько топиков обогащаем статистикой одновременно
+ENRICH_CONCURRENCY = 3
+
+# Повторы запроса истории при FloodWait; дольше RPC_MAX_FLOOD_WAIT секунд не ждем
+RPC_FLOOD_RETRIES = 3
+RPC_MAX_FLOOD_WAIT = 30
+
 class TopicScanner:
     """Сканер топиков с поддержкой bot и user режимов"""
     
     def __init__(self, db_manager: DatabaseManager):
         self.db_manager = db_manager
-        self.active_scans = {}  # Активные сканирования для предотвращения дублей
+        self.active_scans: Dict[Tuple[int, int], float] = {}  # (chat_id, user_id) -> time.monotonic() старта
         
     @PerformanceUtils.measure_time
     async def scan_topics(self, chat_id: int, user_id: int, mode: str = 'bot') -> Dict[str, Any]:
@@ -46,7 +56,7 @@ class TopicScanner:
         """
         
         # Проверяем не идет ли уже сканирование этого чата
-        scan_key = f"{chat_id}_{user_id}"
+        scan_key = (chat_id, user_id)
         if scan_key in self.active_scans:
             return {
                 'success': False,
@@ -55,7 +65,7 @@ class TopicScanner:
             }
         
         try:
-            self.active_scans[scan_key] = datetime.now()
+            self.active_scans[scan_key] = time.monotonic()
             
             if mode == 'user':
                 return await self._scan_user_mode(chat_id, user_id)
@@ -83,7 +93,7 @@ class TopicScanner:
             logger.debug(f"🤖 Сканирование в режиме бота: {chat_id}")
             
             # Пока заглушка - в реальной реализации получим топики через Bot API
-            topics = await self._get_topics_bot_api(chat_id)
+            topics = self._get_topics_bot_api(chat_id)
             
             # Сохраняем результаты в БД
             await self._save_scan_results(chat_id, user_id, topics, 'bot')
@@ -216,7 +226,7 @@ class TopicScanner:
                 'data': None
             }
     
-    async def _get_topics_bot_api(self, chat_id: int) -> List[Dict[str, Any]]:
+    def _get_topics_bot_api(self, chat_id: int) -> List[Dict[str, Any]]:
         """Получение топиков через Bot API (ограниченный функционал)"""
         
         # В режиме бота получаем только базовую информацию
@@ -286,42 +296,64 @@ class TopicScanner:
                                 topics: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Обогащение данных топиков дополнительной информацией"""
         
-        enriched_topics = []
+        # Порог "недавней активности" считаем один раз на всё сканирование.
+        # Даты сообщений Telethon в UTC с tzinfo, поэтому и порог aware
+        recent_threshold = datetime.now(timezone.utc) - timedelta(hours=24)
         
-        for topic in topics:
-            try:
-                # Получаем статистику сообщений в топике
-                topic_stats = await self._get_topic_message_stats(client, chat_id, topic['id'])
-                
-                # Обогащаем данные
-                enriched_topic = {
-                    **topic,
-                    'message_count': topic_stats.get('message_count', 0),
-                    'last_message_date': topic_stats.get('last_message_date'),
-                    'unique_users': topic_stats.get('unique_users', 0),
-                    'avg_messages_per_day': topic_stats.get('avg_messages_per_day', 0),
-                    'most_active_user': topic_stats.get('most_active_user'),
-                    'recent_activity': topic_stats.get('recent_activity', False)
-                }
-                
-                enriched_topics.append(enriched_topic)
+        # Ограничиваем число одновременных запросов истории, чтобы не нарваться на FloodWait
+        semaphore = asyncio.Semaphore(ENRICH_CONCURRENCY)
+        # Выставляется при долгом FloodWait: оставшиеся топики не запрашиваем
+        flood_stop = asyncio.Event()
+        
+        async def enrich_topic(topic: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                if flood_stop.is_set():
+                    return topic
                 
-                # Небольшая задержка чтобы не нарваться на rate limit
-                await asyncio.sleep(0.5)
+                try:
+                    # Получаем статистику сообщений в топике
+                    topic_stats = await self._get_topic_message_stats(
+                        client, chat_id, topic['id'], recent_threshold
+                    )
+                    
+                    # Обогащаем данные на месте: топики только что получены из
+                    # _get_topics_user_api, копировать каждый словарь незачем
+                    topic.update(topic_stats)
+                    
+                    # Небольшая задержка чтобы не нарваться на rate limit
+                    await asyncio.sleep(0.5)
+                    
+                except FloodWaitError as e:
+                    if not flood_stop.is_set():
+                        logger.warning(f"⏳ FloodWait {e.seconds} сек - статистика оставшихся топиков пропущена")
+                    flood_stop.set()
+                except Exception as e:
+                    logger.warning(f"⚠️ Ошибка обогащения данных топика {topic['id']}: {e}")
                 
-            except Exception as e:
-                logger.warning(f"⚠️ Ошибка обогащения данных топика {topic['id']}: {e}")
-                enriched_topics.append(topic)
+                return topic
         
-        return enriched_topics
+        # gather сохраняет порядок топиков
+        return list(await asyncio.gather(*(enrich_topic(topic) for topic in topics)))
+    
+    async def _request_with_flood_wait(self, client: TelegramClient, request):
+        """Выполнение запроса с ожиданием и повтором при коротком FloodWait"""
+        for attempt in range(RPC_FLOOD_RETRIES):
+            try:
+                return await client(request)
+            except FloodWaitError as e:
+                if attempt == RPC_FLOOD_RETRIES - 1 or e.seconds > RPC_MAX_FLOOD_WAIT:
+                    raise
+                logger.warning(f"⏳ FloodWait {e.seconds} сек, повтор запроса")
+                await asyncio.sleep(e.seconds)
     
     async def _get_topic_message_stats(self, client: TelegramClient, chat_id: int, 
-                                     topic_id: int) -> Dict[str, Any]:
+                                     topic_id: int,
+                                     recent_threshold: Optional[datetime] = None) -> Dict[str, Any]:
         """Получение статистики сообщений в топике"""
         
         try:
             # Получаем последние сообщения из топика
-            history = await client(GetHistoryRequest(
+            history = await self._request_with_flood_wait(client, GetHistoryRequest(
                 peer=chat_id,
                 offset_id=0,
                 offset_date=None,
@@ -348,25 +380,27 @@ class TopicScanner:
                 stats['last_message_date'] = last_message.date.isoformat()
                 
                 # Проверяем активность за последние 24 часа
-                recent_threshold = datetime.now() - timedelta(hours=24)
+                if recent_threshold is None:
+                    recent_threshold = datetime.now(timezone.utc) - timedelta(hours=24)
                 stats['recent_activity'] = last_message.date > recent_threshold
                 
                 # Подсчитываем уникальных пользователей
-                user_message_counts = {}
-                for msg in history.messages:
-                    if hasattr(msg, 'from_id') and msg.from_id:
-                        user_id = msg.from_id.user_id if hasattr(msg.from_id, 'user_id') else str(msg.from_id)
-                        user_message_counts[user_id] = user_message_counts.get(user_id, 0) + 1
+                user_message_counts = Counter(
+                    from_id.user_id if hasattr(from_id, 'user_id') else str(from_id)
+                    for from_id in (getattr(msg, 'from_id', None) for msg in history.messages)
+                    if from_id
+                )
                 
                 stats['unique_users'] = len(user_message_counts)
                 
                 # Самый активный пользователь
                 if user_message_counts:
-                    most_active_user_id = max(user_message_counts.keys(), 
-                                            key=lambda x: user_message_counts[x])
+                    most_active_user_id, most_active_count = max(
+                        user_message_counts.items(), key=itemgetter(1)
+                    )
                     stats['most_active_user'] = {
                         'user_id': most_active_user_id,
-                        'message_count': user_message_counts[most_active_user_id]
+                        'message_count': most_active_count
                     }
                 
                 # Средние сообщения в день (примерная оценка)
@@ -378,6 +412,9 @@ class TopicScanner:
             
             return stats
             
+        except FloodWaitError:
+            # Не маскируем под нулевую статистику - решает _enrich_topics_data
+            raise
         except Exception as e:
             logger.debug(f"Ошибка получения статистики топика {topic_id}: {e}")
             return {
@@ -471,12 +508,12 @@ class TopicScanner:
     def cleanup_active_scans(self):
         """Очистка зависших сканирований"""
         try:
-            current_time = datetime.now()
-            timeout = timedelta(minutes=10)  # Таймаут 10 минут
+            # Монотонные часы не зависят от переводов системного времени
+            deadline = time.monotonic() - 600  # Таймаут 10 минут
             
             expired_scans = [
                 key for key, start_time in self.active_scans.items()
-                if current_time - start_time > timeout
+                if start_time < deadline
             ]
             
             for key in expired_scans:
@@ -499,23 +536,25 @@ def format_topic_info(topic: Dict[str, Any]) -> str:
     
     status = "🔒 Закрыт" if is_closed else "🟢 Активен"
     
-    result = f"📌 **{title}**\n"
-    result += f"   ID: `{topic.get('id', 'N/A')}`\n"
-    result += f"   Статус: {status}\n"
-    result += f"   Сообщений: {message_count}\n"
+    lines = [
+        f"📌 **{title}**\n",
+        f"   ID: `{topic.get('id', 'N/A')}`\n",
+        f"   Статус: {status}\n",
+        f"   Сообщений: {message_count}\n",
+    ]
     
     if unique_users > 0:
-        result += f"   Участников: {unique_users}\n"
+        lines.append(f"   Участников: {unique_users}\n")
     
     if last_activity:
         try:
             activity_date = datetime.fromisoformat(last_activity.replace('Z', '+00:00'))
-            from utils import format_timespan
-            result += f"   Последняя активность: {format_timespan(activity_date)}\n"
-        except:
+            lines.append(f"   Последняя активность: {format_timespan(activity_date)}\n")
+        except (ValueError, TypeError, AttributeError):
+            # Дата в неожиданном формате - просто не показываем активность
             pass
     
-    return result
+    return ''.join(lines)
 
 def validate_chat_for_scanning(chat_entity) -> tuple[bool, str]:
     """Валидация чата для сканирования топиков"""
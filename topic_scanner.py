@@ -7,65 +7,107 @@
 import asyncio
 import logging
 from datetime import datetime
-from typing import List, Dict, Any, Optional
-from telethon import TelegramClient
+from typing import List, Dict, Any, Optional, Tuple, Callable
+from telethon import TelegramClient, utils as telethon_utils
 from telethon.tl.types import Channel
-from telethon.tl.functions.channels import GetFullChannelRequest, GetForumTopicsRequest
+from telethon.tl.functions.channels import GetForumTopicsRequest
 from telethon.tl.functions.messages import GetHistoryRequest
-from telethon.errors import ChatAdminRequiredError, ChannelPrivateError
+from telethon.errors import ChatAdminRequiredError, ChannelPrivateError, FloodWaitError
 
 logger = logging.getLogger(__name__)
 
+# Часто встречающиеся ID топиков для эвристического поиска
+COMMON_TOPIC_IDS = (2, 3, 4, 5, 10, 15, 20, 25, 30, 50, 100)
+
+# Максимум entity создателей топиков в кэше одного UserTopicScanner
+ENTITY_CACHE_SIZE = 4096
+
+# Необязательные поля ForumTopic: атрибут Telethon -> ключ в записи топика
+FORUM_TOPIC_EXTRA_FIELDS = (
+    ('closed', 'is_closed'),
+    ('pinned', 'is_pinned'),
+    ('hidden', 'is_hidden'),
+    ('icon_color', 'icon_color'),
+    ('icon_emoji_id', 'icon_emoji_id'),
+)
+
+# Маркер отсутствующего атрибута (None - допустимое значение поля)
+_MISSING = object()
+
+# Лимит одновременных RPC одного сканера (предзагрузка страниц + создатели топиков)
+RPC_CONCURRENCY = 6
+RPC_FLOOD_RETRIES = 3
+RPC_MAX_FLOOD_WAIT = 30  # Дольше ждать в обработчике команды нет смысла
+
+def _fallback_topic_link(topic_id: int) -> str:
+    """Ссылка-заглушка, если у чата нет числового ID"""
+    return f"#topic_{topic_id}"
+
+def make_link_builder(chat) -> Callable[[int], str]:
+    """Построитель ссылок на топики чата: разбор chat.id выполняется один раз"""
+    chat_id = str(getattr(chat, 'id', '') if chat else '').replace('-100', '')
+    if not chat_id.isdigit():
+        return _fallback_topic_link
+    
+    base_url = f"https://t.me/c/{chat_id}/"
+    return lambda topic_id: f"{base_url}{topic_id}"
+
 def get_topic_link(chat, topic_id: int) -> str:
     """Генерация ссылки на топик"""
-    try:
-        if not chat:
-            return f"#topic_{topic_id}"
-        
-        if hasattr(chat, 'id'):
-            chat_id = str(chat.id).replace('-100', '')
-        else:
-            return f"#topic_{topic_id}"
-        
-        if not chat_id.isdigit():
-            return f"#topic_{topic_id}"
-        
-        link = f"https://t.me/c/{chat_id}/{topic_id}"
-        return link
-        
-    except Exception as e:
-        logger.debug(f"Ошибка генерации ссылки на топик {topic_id}: {e}")
-        return f"#topic_{topic_id}"
+    return make_link_builder(chat)(topic_id)
 
 def is_forum_chat(chat) -> bool:
     """Проверка, является ли чат форумом"""
-    try:
-        return (isinstance(chat, Channel) and 
-                hasattr(chat, 'forum') and 
-                chat.forum and
-                hasattr(chat, 'megagroup') and 
-                chat.megagroup)
-    except:
-        return False
+    # Большинство чатов не форумы - сначала самая дешевая и чаще всего ложная проверка
+    return bool(getattr(chat, 'forum', False) and 
+                getattr(chat, 'megagroup', False) and 
+                isinstance(chat, Channel))
 
 class BaseTopicScanner:
     """Базовый класс для сканеров топиков"""
     
     def __init__(self, client: TelegramClient):
         self.client = client
+        self._chat_cache: Dict[int, Tuple[bool, Callable[[int], str]]] = {}  # chat.id -> (форум?, построитель ссылок)
+        self._rpc_semaphore = asyncio.Semaphore(RPC_CONCURRENCY)
+    
+    async def _rpc(self, request):
+        """Выполнение RPC через семафор сканера с ожиданием при FloodWait"""
+        async with self._rpc_semaphore:
+            for attempt in range(RPC_FLOOD_RETRIES):
+                try:
+                    return await self.client(request)
+                except FloodWaitError as e:
+                    if attempt == RPC_FLOOD_RETRIES - 1 or e.seconds > RPC_MAX_FLOOD_WAIT:
+                        raise
+                    logger.warning(f"⏳ FloodWait {e.seconds} сек, повтор запроса")
+                    await asyncio.sleep(e.seconds)
+    
+    def _prepare_chat(self, chat) -> Tuple[bool, Callable[[int], str]]:
+        """Признак форума и построитель ссылок чата - считаем один раз на чат"""
+        chat_key = getattr(chat, 'id', None)
+        cached = self._chat_cache.get(chat_key) if chat_key is not None else None
+        if cached is not None:
+            return cached
+        
+        prepared = (is_forum_chat(chat), make_link_builder(chat))
+        if chat_key is not None:
+            self._chat_cache[chat_key] = prepared
+        return prepared
     
     def create_topic_entry(self, topic_id: int, title: str, created_by: str = "Неизвестно", 
                           messages: Any = "неизвестно", chat=None, **kwargs) -> Dict[str, Any]:
         """Создать запись о топике"""
-        entry = {
+        build_link = self._prepare_chat(chat)[1] if chat else _fallback_topic_link
+        # Запись собирается одним литералом; kwargs (в т.ч. 'link') перекрывают базовые поля
+        return {
             'id': topic_id,
             'title': title,
             'created_by': created_by,
             'messages': messages,
-            'link': get_topic_link(chat, topic_id) if chat else f"#topic_{topic_id}"
+            'link': build_link(topic_id),
+            **kwargs
         }
-        entry.update(kwargs)
-        return entry
 
 class BotTopicScanner(BaseTopicScanner):
     """Сканер топиков для режима бота (ограниченный)"""
@@ -85,19 +127,14 @@ class BotTopicScanner(BaseTopicScanner):
             ))
             
             # Проверяем, является ли чат форумом
-            if is_forum_chat(chat):
+            if self._prepare_chat(chat)[0]:
                 logger.info("📂 Сканирование форума в режиме бота...")
                 
-                # Метод 1: GetFullChannelRequest
-                additional_topics = await self._try_full_channel_request(chat)
-                topics_data.extend(additional_topics)
-                
-                # Метод 2: Сканирование сообщений
-                if len(additional_topics) == 0:
-                    message_topics = await self._scan_messages_for_topics(chat)
-                    topics_data.extend(message_topics)
+                # Метод 1: Сканирование сообщений
+                message_topics = await self._scan_messages_for_topics(chat)
+                topics_data.extend(message_topics)
                 
-                # Метод 3: Эвристический поиск
+                # Метод 2: Эвристический поиск
                 if len(topics_data) == 1:  # Только General
                     heuristic_topics = await self._heuristic_topic_search(chat)
                     topics_data.extend(heuristic_topics)
@@ -130,18 +167,6 @@ class BotTopicScanner(BaseTopicScanner):
         
         return topics_data
     
-    async def _try_full_channel_request(self, chat) -> List[Dict[str, Any]]:
-        """GetFullChannelRequest для проверки API"""
-        topics = []
-        try:
-            full_channel = await self.client(GetFullChannelRequest(chat))
-            logger.debug("✅ GetFullChannelRequest выполнен")
-            # В Bot API это не содержит информацию о топиках
-        except Exception as e:
-            logger.debug(f"GetFullChannelRequest не сработал: {e}")
-        
-        return topics
-    
     async def _scan_messages_for_topics(self, chat) -> List[Dict[str, Any]]:
         """Сканирование сообщений для поиска топиков"""
         topics = []
@@ -150,7 +175,7 @@ class BotTopicScanner(BaseTopicScanner):
         try:
             logger.info("🔍 Сканирование сообщений для поиска топиков...")
             
-            messages = await self.client(GetHistoryRequest(
+            messages = await self._rpc(GetHistoryRequest(
                 peer=chat,
                 offset_id=0,
                 offset_date=None,
@@ -196,37 +221,30 @@ class BotTopicScanner(BaseTopicScanner):
         try:
             logger.info("🎯 Эвристический поиск топиков...")
             
-            common_topic_ids = [2, 3, 4, 5, 10, 15, 20, 25, 30, 50, 100]
+            # Параметры запроса не зависят от ID топика, поэтому одна проверка
+            # "в чате есть сообщения" отвечает сразу за все предполагаемые топики
+            probe = await self._rpc(GetHistoryRequest(
+                peer=chat,
+                offset_id=0,
+                offset_date=None,
+                add_offset=0,
+                limit=1,
+                max_id=0,
+                min_id=0,
+                hash=0
+            ))
             
-            for topic_id in common_topic_ids:
-                try:
-                    topic_messages = await self.client(GetHistoryRequest(
-                        peer=chat,
-                        offset_id=0,
-                        offset_date=None,
-                        add_offset=0,
-                        limit=1,
-                        max_id=0,
-                        min_id=0,
-                        hash=0
-                    ))
-                    
-                    if topic_messages.messages:
-                        topics.append(self.create_topic_entry(
-                            topic_id=topic_id,
-                            title=f"Topic {topic_id}",
-                            created_by="Эвристически",
-                            messages="предполагаемый",
-                            chat=chat
-                        ))
-                        
-                        if len(topics) >= 5:
-                            break
-                            
-                except Exception:
-                    continue
-                
-                await asyncio.sleep(0.2)
+            if probe.messages:
+                topics = [
+                    self.create_topic_entry(
+                        topic_id=topic_id,
+                        title=f"Topic {topic_id}",
+                        created_by="Эвристически",
+                        messages="предполагаемый",
+                        chat=chat
+                    )
+                    for topic_id in COMMON_TOPIC_IDS[:5]
+                ]
             
             if topics:
                 logger.info(f"✅ Найдено {len(topics)} топиков эвристически")
@@ -239,6 +257,12 @@ class BotTopicScanner(BaseTopicScanner):
 class UserTopicScanner(BaseTopicScanner):
     """Сканер топиков для пользовательского режима (полный доступ)"""
     
+    def __init__(self, client: TelegramClient):
+        super().__init__(client)
+        # Кэш создателей топиков: свой у каждого сканера, т.к. entity
+        # получены через клиент конкретного пользователя
+        self._entity_cache: Dict[int, Any] = {}
+    
     async def scan_topics(self, chat) -> List[Dict[str, Any]]:
         """Полное сканирование топиков в пользовательском режиме"""
         topics_data = []
@@ -254,7 +278,7 @@ class UserTopicScanner(BaseTopicScanner):
             ))
             
             # Если это форум, получаем ВСЕ остальные топики
-            if is_forum_chat(chat):
+            if self._prepare_chat(chat)[0]:
                 logger.info("📂 Полное сканирование форума (пользовательский режим)...")
                 
                 forum_topics = await self._scan_forum_topics(chat)
@@ -282,55 +306,60 @@ class UserTopicScanner(BaseTopicScanner):
         topics = []
         
         try:
-            offset_date = None
-            offset_id = 0
-            offset_topic = 0
             limit = 100
             total_scanned = 0
             max_topics = 1000  # Ограничение для безопасности
             
-            while total_scanned < max_topics:
-                try:
-                    result = await self.client(GetForumTopicsRequest(
-                        channel=chat,
-                        offset_date=offset_date,
-                        offset_id=offset_id,
-                        offset_topic=offset_topic,
-                        limit=limit
-                    ))
-                    
-                    if not result.topics:
+            next_page = asyncio.create_task(self._fetch_topics_page(chat, None, 0, limit))
+            try:
+                while next_page is not None:
+                    try:
+                        result = await next_page
+                        next_page = None
+                        
+                        if not result.topics:
+                            break
+                        
+                        total_scanned += len(result.topics)
+                        
+                        # Сервер сообщает общее число топиков: если все уже получены,
+                        # лишний запрос пустой страницы не нужен
+                        has_more = (len(result.topics) >= limit and 
+                                    total_scanned < getattr(result, 'count', max_topics))
+                        
+                        # Следующую страницу запрашиваем сразу, до обработки текущей:
+                        # сеть и обработка идут параллельно
+                        if has_more and total_scanned < max_topics:
+                            last_topic = result.topics[-1]
+                            next_page = asyncio.create_task(self._fetch_topics_page(
+                                chat, getattr(last_topic, 'date', None), last_topic.id, limit,
+                                delay=0.5  # Безопасная задержка между запросами
+                            ))
+                        
+                        # Создателей всех топиков страницы получаем одним запросом
+                        creators = await self._resolve_creators(result.topics)
+                        
+                        # Обрабатываем каждый топик
+                        for topic in result.topics:
+                            if hasattr(topic, 'id') and hasattr(topic, 'title'):
+                                topic_data = self._process_forum_topic(topic, chat, creators)
+                                if topic_data:
+                                    topics.append(topic_data)
+                        
+                    except ChatAdminRequiredError:
+                        logger.warning("⚠️ Требуются права администратора для полного сканирования")
                         break
-                    
-                    # Обрабатываем каждый топик
-                    for topic in result.topics:
-                        if hasattr(topic, 'id') and hasattr(topic, 'title'):
-                            topic_data = await self._process_forum_topic(topic, chat)
-                            if topic_data:
-                                topics.append(topic_data)
-                    
-                    total_scanned += len(result.topics)
-                    
-                    # Обновляем offset для следующей итерации
-                    if len(result.topics) < limit:
+                    except ChannelPrivateError:
+                        logger.warning("⚠️ Нет доступа к приватному каналу")
                         break
-                    
-                    last_topic = result.topics[-1]
-                    offset_topic = last_topic.id
-                    offset_date = getattr(last_topic, 'date', None)
-                    
-                    # Безопасная задержка между запросами
-                    await asyncio.sleep(0.5)
-                    
-                except ChatAdminRequiredError:
-                    logger.warning("⚠️ Требуются права администратора для полного сканирования")
-                    break
-                except ChannelPrivateError:
-                    logger.warning("⚠️ Нет доступа к приватному каналу")
-                    break
-                except Exception as e:
-                    logger.warning(f"⚠️ Ошибка при получении топиков: {e}")
-                    break
+                    except Exception as e:
+                        logger.warning(f"⚠️ Ошибка при получении топиков: {e}")
+                        break
+            finally:
+                # Прерванный цикл не должен оставлять висящий запрос страницы
+                if next_page is not None:
+                    next_page.cancel()
+                    await asyncio.gather(next_page, return_exceptions=True)
             
             logger.info(f"📊 Просканировано {total_scanned} топиков, обработано {len(topics)}")
             
@@ -339,50 +368,102 @@ class UserTopicScanner(BaseTopicScanner):
         
         return topics
     
-    async def _process_forum_topic(self, topic, chat) -> Optional[Dict[str, Any]]:
+    async def _fetch_topics_page(self, chat, offset_date, offset_topic: int, limit: int, 
+                                 delay: float = 0.0):
+        """Запрос одной страницы топиков форума"""
+        if delay:
+            await asyncio.sleep(delay)
+        
+        return await self._rpc(GetForumTopicsRequest(
+            channel=chat,
+            offset_date=offset_date,
+            offset_id=0,
+            offset_topic=offset_topic,
+            limit=limit
+        ))
+    
+    async def _resolve_creators(self, forum_topics) -> Dict[int, Any]:
+        """Получение создателей топиков одним запросом: peer_id -> entity"""
+        creators = {}
+        peers = {}
+        for topic in forum_topics:
+            from_id = getattr(topic, 'from_id', None)
+            if from_id:
+                peer_id = telethon_utils.get_peer_id(from_id)
+                cached = self._entity_cache.get(peer_id)
+                if cached is not None:
+                    creators[peer_id] = cached
+                else:
+                    peers.setdefault(peer_id, from_id)
+        
+        if not peers:
+            return creators
+        
+        resolved = {}
+        try:
+            entities = await self.client.get_entity(list(peers.values()))
+            resolved = dict(zip(peers, entities))
+        except Exception as e:
+            # Один нерезолвящийся peer валит весь пакет - добираем по одному
+            logger.debug(f"Пакетное получение создателей не сработало: {e}")
+            for peer_id, from_id in peers.items():
+                try:
+                    resolved[peer_id] = await self.client.get_entity(from_id)
+                except Exception as e:
+                    logger.debug(f"Не удалось получить создателя {peer_id}: {e}")
+        
+        self._cache_entities(resolved)
+        creators.update(resolved)
+        return creators
+    
+    def _cache_entities(self, entities: Dict[int, Any]):
+        """Сохранение entity в кэш сканера с вытеснением самых старых (FIFO)"""
+        cache = self._entity_cache
+        cache.update(entities)
+        while len(cache) > ENTITY_CACHE_SIZE:
+            del cache[next(iter(cache))]
+    
+    def _process_forum_topic(self, topic, chat, creators: Dict[int, Any]) -> Optional[Dict[str, Any]]:
         """Обработка отдельного топика форума"""
         try:
             # Базовая информация
             topic_id = topic.id
             title = topic.title
             
-            # Информация о создателе
+            # Информация о создателе (уже получена в _resolve_creators)
             creator = "Неизвестно"
-            if hasattr(topic, 'from_id') and topic.from_id:
-                try:
-                    creator_entity = await self.client.get_entity(topic.from_id)
-                    if hasattr(creator_entity, 'username') and creator_entity.username:
-                        creator = f"@{creator_entity.username}"
-                    elif hasattr(creator_entity, 'first_name'):
-                        creator = creator_entity.first_name or "Неизвестно"
-                except Exception as e:
-                    logger.debug(f"Не удалось получить создателя топика {topic_id}: {e}")
+            from_id = getattr(topic, 'from_id', None)
+            if from_id:
+                creator_entity = creators.get(telethon_utils.get_peer_id(from_id))
+                if creator_entity is None:
+                    logger.debug(f"Не удалось получить создателя топика {topic_id}")
+                else:
+                    username = getattr(creator_entity, 'username', None)
+                    first_name = getattr(creator_entity, 'first_name', _MISSING)
+                    if username:
+                        creator = f"@{username}"
+                    elif first_name is not _MISSING:
+                        creator = first_name or "Неизвестно"
             
             # Количество сообщений
-            messages = 0
-            if hasattr(topic, 'replies') and topic.replies:
-                messages = getattr(topic.replies, 'replies', 0)
+            replies = getattr(topic, 'replies', None)
+            messages = getattr(replies, 'replies', 0) if replies else 0
             
             # Дополнительная информация
             extra_info = {}
             
-            if hasattr(topic, 'date'):
-                extra_info['created_date'] = topic.date.strftime('%d.%m.%Y %H:%M')
-            
-            if hasattr(topic, 'closed'):
-                extra_info['is_closed'] = topic.closed
-            
-            if hasattr(topic, 'pinned'):
-                extra_info['is_pinned'] = topic.pinned
-            
-            if hasattr(topic, 'hidden'):
-                extra_info['is_hidden'] = topic.hidden
-            
-            if hasattr(topic, 'icon_color'):
-                extra_info['icon_color'] = topic.icon_color
+            date = getattr(topic, 'date', None)
+            if date is not None:
+                # Формат '%d.%m.%Y %H:%M' без strftime - вызывается на каждый топик
+                extra_info['created_date'] = (
+                    f"{date.day:02d}.{date.month:02d}.{date.year:04d} {date.hour:02d}:{date.minute:02d}"
+                )
             
-            if hasattr(topic, 'icon_emoji_id'):
-                extra_info['icon_emoji_id'] = topic.icon_emoji_id
+            # Один getattr на поле вместо пары hasattr + обращение
+            for attr, key in FORUM_TOPIC_EXTRA_FIELDS:
+                value = getattr(topic, attr, _MISSING)
+                if value is not _MISSING:
+                    extra_info[key] = value
             
             return self.create_topic_entry(
                 topic_id=topic_id,
@@ -449,5 +530,6 @@ __all__ = [
     'UserTopicScanner',
     'TopicScannerFactory',
     'get_topic_link',
+    'make_link_builder',
     'is_forum_chat'
 ]
\ No newline at end of file
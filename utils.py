@@ -4,29 +4,46 @@
 ОБНОВЛЕНО v4.1.1: улучшенные утилиты + безопасность
 """
 
+import atexit
 import logging
+import logging.handlers
+import queue
 import json
 import re
+import time
 import asyncio
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, List, Union
 from cryptography.fernet import Fernet
 import base64
+import functools
 import hashlib
 
+try:
+    import orjson  # Опционально: быстрая сериализация JSON
+except ImportError:
+    orjson = None
+
 from config import ENCRYPTION_KEY, SALT, LOG_LEVEL, DEVELOPMENT_MODE
 
 # === НАСТРОЙКА ЛОГИРОВАНИЯ ===
 
+# Фоновый поток, который пишет логи в консоль, и его QueueHandler (создаются в setup_logging)
+_log_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.handlers.QueueHandler] = None
+
 def setup_logging() -> logging.Logger:
     """Настройка системы логирования"""
+    global _log_listener, _queue_handler
+    
+    level = getattr(logging, LOG_LEVEL.upper(), logging.INFO)
     
     # Создаем главный логгер
     logger = logging.getLogger('get_id_bot')
-    logger.setLevel(getattr(logging, LOG_LEVEL.upper(), logging.INFO))
+    logger.setLevel(level)
     
     # Избегаем дублирования обработчиков
-    if logger.handlers:
+    if _log_listener is not None:
         return logger
     
     # Создаем обработчик для консоли
@@ -48,7 +65,20 @@ def setup_logging() -> logging.Logger:
         )
     
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    
+    # QueueHandler ставим на корневой логгер: туда же всплывают логгеры модулей
+    # (logging.getLogger(__name__)) и get_id_bot. Запись в stderr выполняет поток
+    # QueueListener, и корутины не блокируют event loop на вводе-выводе
+    log_queue = queue.SimpleQueue()
+    _queue_handler = logging.handlers.QueueHandler(log_queue)
+    root_logger = logging.getLogger()
+    root_logger.setLevel(level)
+    root_logger.addHandler(_queue_handler)
+    _log_listener = logging.handlers.QueueListener(
+        log_queue, console_handler, respect_handler_level=True
+    )
+    _log_listener.start()
+    atexit.register(stop_logging)
     
     # Настраиваем логгеры телеграм библиотек
     logging.getLogger('telethon').setLevel(logging.WARNING)
@@ -56,8 +86,20 @@ def setup_logging() -> logging.Logger:
     
     return logger
 
+def stop_logging():
+    """Остановка фонового логирования с записью оставшихся сообщений"""
+    global _log_listener, _queue_handler
+    if _log_listener is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _log_listener.stop()
+        _log_listener = None
+        _queue_handler = None
+
 # === УТИЛИТЫ ДЛЯ СООБЩЕНИЙ ===
 
+# Таблица экранирования специальных символов Markdown: символ -> \символ
+_MARKDOWN_ESCAPE_TABLE = str.maketrans({char: f'\\{char}' for char in '_*[]()~`>#+-=|{}.!'})
+
 class MessageUtils:
     """Утилиты для работы с сообщениями Telegram"""
     
@@ -82,18 +124,14 @@ class MessageUtils:
             try:
                 fallback_text = "❌ Ошибка отправки сообщения. Попробуйте еще раз."
                 return await event.respond(fallback_text)
-            except:
+            except Exception:
                 pass  # Если и это не работает, молча игнорируем
     
     @staticmethod
     def escape_markdown(text: str) -> str:
         """Экранирование специальных символов Markdown"""
-        escape_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-        
-        for char in escape_chars:
-            text = text.replace(char, f'\\{char}')
-        
-        return text
+        # Один проход translate вместо отдельного replace на каждый символ
+        return text.translate(_MARKDOWN_ESCAPE_TABLE)
     
     @staticmethod
     def format_code_block(code: str, language: str = '') -> str:
@@ -111,31 +149,38 @@ class MessageUtils:
         if len(text) <= max_length:
             return text
         
-        # Обрезаем по словам если возможно
-        words = text[:max_length - len(suffix)].split()
-        if len(words) > 1:
-            words.pop()  # Убираем последнее неполное слово
-            return ' '.join(words) + suffix
+        cut = text[:max_length - len(suffix)]
+        
+        # Обрезаем по словам если возможно: rsplit с maxsplit=1 идет с конца
+        # и отрезает только последнее неполное слово, не разбивая весь текст
+        head = cut.rsplit(None, 1)
+        if len(head) > 1:
+            return head[0] + suffix
         
-        return text[:max_length - len(suffix)] + suffix
+        return cut + suffix
 
 # === УТИЛИТЫ ШИФРОВАНИЯ ===
 
+# Начало любого токена Fernet (байт версии 0x80 + старшие нулевые байты времени).
+# Значения старого формата (base64 поверх токена) начинаются иначе
+_FERNET_TOKEN_PREFIX = 'gAAAAA'
+
+@functools.cache
+def _get_cipher() -> Fernet:
+    """Объект шифрования - создается один раз на процесс"""
+    # Создаем ключ из ENCRYPTION_KEY
+    key = base64.urlsafe_b64encode(
+        hashlib.sha256(ENCRYPTION_KEY.encode()).digest()
+    )
+    return Fernet(key)
+
 class EncryptionUtils:
     """Утилиты для шифрования данных"""
     
-    _fernet = None
-    
     @classmethod
     def get_cipher(cls):
         """Получение объекта шифрования"""
-        if cls._fernet is None:
-            # Создаем ключ из ENCRYPTION_KEY
-            key = base64.urlsafe_b64encode(
-                hashlib.sha256(ENCRYPTION_KEY.encode()).digest()
-            )
-            cls._fernet = Fernet(key)
-        return cls._fernet
+        return _get_cipher()
     
     @classmethod
     def encrypt(cls, data: str) -> str:
@@ -144,11 +189,11 @@ class EncryptionUtils:
             if not data:
                 return ''
             
-            cipher = cls.get_cipher()
+            cipher = _get_cipher()
             # Добавляем соль для дополнительной безопасности
             salted_data = f"{SALT}:{data}"
-            encrypted_bytes = cipher.encrypt(salted_data.encode())
-            return base64.urlsafe_b64encode(encrypted_bytes).decode()
+            # Токен Fernet уже urlsafe-base64 - храним его как есть
+            return cipher.encrypt(salted_data.encode()).decode('ascii')
             
         except Exception as e:
             logging.getLogger(__name__).error(f"❌ Ошибка шифрования: {e}")
@@ -161,8 +206,11 @@ class EncryptionUtils:
             if not encrypted_data:
                 return ''
             
-            cipher = cls.get_cipher()
-            encrypted_bytes = base64.urlsafe_b64decode(encrypted_data.encode())
+            cipher = _get_cipher()
+            encrypted_bytes = encrypted_data.encode('ascii')
+            if not encrypted_data.startswith(_FERNET_TOKEN_PREFIX):
+                # Старый формат: токен Fernet дополнительно обернут в base64
+                encrypted_bytes = base64.urlsafe_b64decode(encrypted_bytes)
             decrypted_data = cipher.decrypt(encrypted_bytes).decode()
             
             # Убираем соль
@@ -182,6 +230,21 @@ class EncryptionUtils:
 
 # === УТИЛИТЫ ВАЛИДАЦИИ ===
 
+# API_HASH - строка из шестнадцатеричных цифр
+_HEX_RE = re.compile(r'[0-9a-fA-F]+')
+
+# Шаблон URL для validate_url
+_URL_RE = re.compile(
+    r'^https?://'  # http:// или https://
+    r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+[A-Z]{2,6}\.?|'  # domain...
+    r'localhost|'  # localhost...
+    r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'  # ...или IP
+    r'(?::\d+)?'  # опциональный порт
+    r'(?:/?|[/?]\S+)$', re.IGNORECASE)
+
+# Символы, недопустимые в имени файла, заменяем на '_'
+_UNSAFE_FILENAME_TABLE = str.maketrans(dict.fromkeys('<>:"/\\|?*', '_'))
+
 class ValidationUtils:
     """Утилиты для валидации данных"""
     
@@ -199,9 +262,7 @@ class ValidationUtils:
                 return False
             
             # Проверяем что это hex строка
-            int(api_hash, 16)
-            
-            return True
+            return _HEX_RE.fullmatch(api_hash) is not None
             
         except (ValueError, TypeError):
             return False
@@ -228,21 +289,17 @@ class ValidationUtils:
     @staticmethod
     def validate_url(url: str) -> bool:
         """Валидация URL"""
-        url_pattern = re.compile(
-            r'^https?://'  # http:// или https://
-            r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+[A-Z]{2,6}\.?|'  # domain...
-            r'localhost|'  # localhost...
-            r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'  # ...или IP
-            r'(?::\d+)?'  # опциональный порт
-            r'(?:/?|[/?]\S+)$', re.IGNORECASE)
+        # Без схемы http(s):// шаблон заведомо не совпадет - не запускаем regex
+        if not url[:8].lower().startswith(('http://', 'https://')):
+            return False
         
-        return url_pattern.match(url) is not None
+        return _URL_RE.match(url) is not None
     
     @staticmethod
     def sanitize_filename(filename: str) -> str:
         """Очистка имени файла от опасных символов"""
         # Убираем опасные символы
-        sanitized = re.sub(r'[<>:"/\\|?*]', '_', filename)
+        sanitized = filename.translate(_UNSAFE_FILENAME_TABLE)
         
         # Ограничиваем длину
         if len(sanitized) > 100:
@@ -252,6 +309,22 @@ class ValidationUtils:
 
 # === УТИЛИТЫ ФОРМАТИРОВАНИЯ ===
 
+# Маркер отсутствующего атрибута: у объектов Telethon важно именно наличие поля
+_MISSING = object()
+
+# Шаблон результата extract_chat_info и поля для частных случаев
+_CHAT_INFO_DEFAULT = {
+    'chat_id': None,
+    'chat_type': 'unknown',
+    'chat_title': None,
+    'is_group': False,
+    'is_supergroup': False,
+    'is_channel': False,
+    'is_private': False
+}
+_PRIVATE_CHAT_INFO = {'is_private': True, 'chat_type': 'private'}
+_GROUP_CHAT_INFO = {'is_group': True, 'chat_type': 'group'}
+
 def format_user_info(user_data: Dict[str, Any]) -> str:
     """Форматирование информации о пользователе"""
     username = user_data.get('telegram_username', 'N/A')
@@ -309,19 +382,21 @@ def is_group_message(event) -> bool:
     """Проверка является ли сообщение из группы"""
     try:
         # Проверяем тип чата
-        if hasattr(event, 'is_group') and event.is_group:
+        if getattr(event, 'is_group', False):
             return True
         
         # Проверяем по ID чата (отрицательные для групп)
-        if hasattr(event, 'chat_id') and event.chat_id < 0:
+        chat_id = getattr(event, 'chat_id', _MISSING)
+        if chat_id is not _MISSING and chat_id < 0:
             return True
         
         # Дополнительная проверка через объект чата
-        if hasattr(event, 'chat'):
-            chat = event.chat
-            if hasattr(chat, 'megagroup') and chat.megagroup:
+        chat = getattr(event, 'chat', None)
+        if chat is not None:
+            if getattr(chat, 'megagroup', False):
                 return True
-            if hasattr(chat, 'broadcast') and not chat.broadcast:
+            broadcast = getattr(chat, 'broadcast', _MISSING)
+            if broadcast is not _MISSING and not broadcast:
                 return True
         
         return False
@@ -331,47 +406,33 @@ def is_group_message(event) -> bool:
 
 def extract_chat_info(event) -> Dict[str, Any]:
     """Извлечение информации о чате"""
-    info = {
-        'chat_id': None,
-        'chat_type': 'unknown',
-        'chat_title': None,
-        'is_group': False,
-        'is_supergroup': False,
-        'is_channel': False,
-        'is_private': False
-    }
+    info = _CHAT_INFO_DEFAULT.copy()
     
     try:
-        if hasattr(event, 'chat_id'):
-            info['chat_id'] = event.chat_id
+        chat_id = getattr(event, 'chat_id', None)
+        info['chat_id'] = chat_id
         
-        if hasattr(event, 'chat'):
-            chat = event.chat
-            
-            if hasattr(chat, 'title'):
-                info['chat_title'] = chat.title
-            
-            if hasattr(chat, 'megagroup'):
-                info['is_supergroup'] = chat.megagroup
-                info['is_group'] = True
-                info['chat_type'] = 'supergroup'
-            elif hasattr(chat, 'broadcast'):
-                info['is_channel'] = chat.broadcast
-                info['chat_type'] = 'channel'
-            elif event.chat_id > 0:
-                info['is_private'] = True
-                info['chat_type'] = 'private'
-            else:
-                info['is_group'] = True
-                info['chat_type'] = 'group'
+        chat = getattr(event, 'chat', _MISSING)
+        if chat is _MISSING:
+            if chat_id:
+                info.update(_PRIVATE_CHAT_INFO if chat_id > 0 else _GROUP_CHAT_INFO)
+            return info
         
-        elif event.chat_id:
-            if event.chat_id > 0:
-                info['is_private'] = True
-                info['chat_type'] = 'private'
-            else:
-                info['is_group'] = True
-                info['chat_type'] = 'group'
+        title = getattr(chat, 'title', _MISSING)
+        if title is not _MISSING:
+            info['chat_title'] = title
+        
+        # Тип определяем по наличию атрибутов Telethon (Channel/Chat/User):
+        # шаблон object(attr=...) совпадает, только если атрибут есть
+        match chat:
+            case object(megagroup=megagroup):
+                info.update(is_supergroup=megagroup, is_group=True, chat_type='supergroup')
+            case object(broadcast=broadcast):
+                info.update(is_channel=broadcast, chat_type='channel')
+            case _ if chat_id > 0:
+                info.update(_PRIVATE_CHAT_INFO)
+            case _:
+                info.update(_GROUP_CHAT_INFO)
     
     except Exception as e:
         logging.getLogger(__name__).debug(f"Ошибка извлечения информации о чате: {e}")
@@ -386,6 +447,12 @@ class JSONUtils:
     @staticmethod
     def safe_json_loads(json_str: str, default=None) -> Any:
         """Безопасная загрузка JSON"""
+        if orjson is not None:
+            try:
+                return orjson.loads(json_str)
+            except (ValueError, TypeError):
+                pass  # NaN/Infinity и т.п. orjson не принимает - разбирает встроенный json
+        
         try:
             return json.loads(json_str)
         except (json.JSONDecodeError, TypeError):
@@ -394,6 +461,13 @@ class JSONUtils:
     @staticmethod
     def safe_json_dumps(data: Any, default=None) -> str:
         """Безопасная сериализация в JSON"""
+        if orjson is not None:
+            try:
+                # orjson по умолчанию компактный и без ASCII-экранирования
+                return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode()
+            except TypeError:
+                pass  # Например, int больше 64 бит - сериализует встроенный json
+        
         try:
             return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
         except (TypeError, ValueError):
@@ -402,6 +476,14 @@ class JSONUtils:
     @staticmethod
     def pretty_json(data: Any) -> str:
         """Красивое форматирование JSON"""
+        if orjson is not None:
+            try:
+                return orjson.dumps(
+                    data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+                ).decode()
+            except TypeError:
+                pass  # Например, int больше 64 бит - сериализует встроенный json
+        
         try:
             return json.dumps(data, ensure_ascii=False, indent=2)
         except (TypeError, ValueError):
@@ -448,29 +530,31 @@ class PerformanceUtils:
     @staticmethod
     def measure_time(func):
         """Декоратор для измерения времени выполнения"""
+        logger = logging.getLogger(__name__)
+        
+        # Замер нужен только для debug-лога: без DEBUG вызываем функцию напрямую.
+        # Уровень проверяем на каждом вызове - его могут поменять во время работы
         async def async_wrapper(*args, **kwargs):
-            start_time = datetime.now()
+            if not logger.isEnabledFor(logging.DEBUG):
+                return await func(*args, **kwargs)
+            
+            start_ns = time.perf_counter_ns()
             try:
-                result = await func(*args, **kwargs)
-                return result
+                return await func(*args, **kwargs)
             finally:
-                end_time = datetime.now()
-                duration = (end_time - start_time).total_seconds()
-                logging.getLogger(__name__).debug(
-                    f"⏱️ {func.__name__} выполнен за {duration:.3f}s"
-                )
+                duration = (time.perf_counter_ns() - start_ns) / 1e9
+                logger.debug(f"⏱️ {func.__name__} выполнен за {duration:.3f}s")
         
         def sync_wrapper(*args, **kwargs):
-            start_time = datetime.now()
+            if not logger.isEnabledFor(logging.DEBUG):
+                return func(*args, **kwargs)
+            
+            start_ns = time.perf_counter_ns()
             try:
-                result = func(*args, **kwargs)
-                return result
+                return func(*args, **kwargs)
             finally:
-                end_time = datetime.now()
-                duration = (end_time - start_time).total_seconds()
-                logging.getLogger(__name__).debug(
-                    f"⏱️ {func.__name__} выполнен за {duration:.3f}s"
-                )
+                duration = (time.perf_counter_ns() - start_ns) / 1e9
+                logger.debug(f"⏱️ {func.__name__} выполнен за {duration:.3f}s")
         
         return async_wrapper if asyncio.iscoroutinefunction(func) else sync_wrapper
 
@@ -478,6 +562,7 @@ class PerformanceUtils:
 
 __all__ = [
     'setup_logging',
+    'stop_logging',
     'MessageUtils',
     'EncryptionUtils', 
     'ValidationUtils',
@@ -7,6 +7,8 @@
 import asyncio
 import logging
 import json
+import platform
+import sys
 import time
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
@@ -20,6 +22,13 @@ from database import DatabaseManager
 
 logger = logging.getLogger(__name__)
 
+# Информация о системе не меняется за время работы процесса - считаем один раз
+PYTHON_VERSION = f"{sys.version_info.major}.{sys.version_info.minor}.{sys.version_info.micro}"
+PLATFORM_INFO = platform.platform()
+
+# Сколько секунд отдаём закэшированный health-статус (частый опрос мониторингом)
+HEALTH_CACHE_TTL = 5.0
+
 class WebServer:
     """Веб-сервер с мониторингом и health checks"""
     
@@ -30,6 +39,7 @@ class WebServer:
         self.runner = None
         self.site = None
         self.start_time = datetime.now()
+        self.start_monotonic = time.monotonic()  # для uptime: не зависит от перевода системных часов
         
         # Метрики
         self.metrics = {
@@ -40,6 +50,9 @@ class WebServer:
             'health_checks': 0,
             'uptime_start': self.start_time
         }
+        
+        # Кэш проверок компонентов: (время расчёта по monotonic, статус, компоненты)
+        self._health_cache: Optional[tuple] = None
     
     async def start(self, port: int = 10000):
         """Запуск веб-сервера"""
@@ -110,7 +123,7 @@ class WebServer:
         """Middleware для логирования запросов"""
         start_time = time.time()
         self.metrics['requests_total'] += 1
-        self.metrics['last_request_time'] = datetime.now()
+        self.metrics['last_request_time'] = start_time  # в datetime переводим только при выдаче метрик
         
         try:
             response = await handler(request)
@@ -378,6 +391,25 @@ class WebServer:
     async def get_health_status(self) -> Dict[str, Any]:
         """Получение статуса здоровья системы"""
         
+        now = time.monotonic()
+        if self._health_cache and now - self._health_cache[0] < HEALTH_CACHE_TTL:
+            _, overall_status, components = self._health_cache
+        else:
+            overall_status, components = await self._check_components()
+            self._health_cache = (now, overall_status, components)
+        
+        # Время и uptime считаем на каждый запрос - кэшируются только проверки
+        return {
+            'status': overall_status,
+            'version': APP_VERSION,
+            'uptime': format_timespan(self.start_time),
+            'timestamp': datetime.now().isoformat(),
+            'components': components
+        }
+    
+    async def _check_components(self) -> tuple:
+        """Проверка компонентов системы: (общий статус, компоненты)"""
+        
         components = {}
         overall_status = 'healthy'
         
@@ -423,18 +455,12 @@ class WebServer:
                 'error': str(e)
             }
         
-        return {
-            'status': overall_status,
-            'version': APP_VERSION,
-            'uptime': format_timespan(self.start_time),
-            'timestamp': datetime.now().isoformat(),
-            'components': components
-        }
+        return overall_status, components
     
     async def get_metrics_data(self) -> Dict[str, Any]:
         """Получение метрик системы"""
         
-        uptime_seconds = (datetime.now() - self.start_time).total_seconds()
+        uptime_seconds = time.monotonic() - self.start_monotonic
         
         return {
             'uptime_seconds': uptime_seconds,
@@ -443,7 +469,7 @@ class WebServer:
             'requests_error': self.metrics['requests_error'],
             'success_rate': (self.metrics['requests_success'] / max(1, self.metrics['requests_total'])) * 100,
             'health_checks': self.metrics['health_checks'],
-            'last_request': self.metrics['last_request_time'].isoformat() if self.metrics['last_request_time'] else None,
+            'last_request': datetime.fromtimestamp(self.metrics['last_request_time']).isoformat() if self.metrics['last_request_time'] else None,
             'memory_info': self.get_memory_info(),
             'timestamp': datetime.now().isoformat()
         }
@@ -457,8 +483,8 @@ class WebServer:
         
         # Дополнительная информация
         system_info = {
-            'python_version': f"{__import__('sys').version_info.major}.{__import__('sys').version_info.minor}.{__import__('sys').version_info.micro}",
-            'platform': __import__('platform').platform(),
+            'python_version': PYTHON_VERSION,
+            'platform': PLATFORM_INFO,
             'start_time': self.start_time.isoformat(),
             'configuration': {
                 'database_type': self.db_manager.db_type,
@@ -506,7 +532,7 @@ class WebServer:
                             masked_password = '*' * len(password)
                             return f"{protocol}://{user}:{masked_password}@{host_part}"
             return url
-        except:
+        except (TypeError, ValueError):
             return "masked_url"
     
     async def stop(self):